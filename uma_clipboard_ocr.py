@@ -1,51 +1,155 @@
+import csv
+import logging
+import queue
+import threading
 import time
 import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 
 from PIL import ImageGrab, Image
 
-from uma_ocr_to_csv import extract, append_csv
+from uma_ocr_to_csv import extract, CSV_FIELDS
 
 
+logger = logging.getLogger(__name__)
+
 BASE_DIR = Path(__file__).with_name("data")
 PROCESSED_DIR = BASE_DIR / "processed"
 OUTPUT_CSV = BASE_DIR / "runners.csv"
 
+# OCR runs off the watcher thread so new clipboard events are not missed
+# while an earlier capture is still being extracted.
+_EXECUTOR = ThreadPoolExecutor(max_workers=2)
+_ROW_QUEUE: "queue.Queue[dict]" = queue.Queue()
+
 
 def _hash_image(img: Image.Image) -> str:
-    """Return a hash of the image bytes to detect changes."""
-    md5 = hashlib.md5()
-    md5.update(img.tobytes())
-    return md5.hexdigest()
+    """Return a cheap fingerprint of the image to detect changes.
 
+    Hashing a 32x32 thumbnail plus the original size is enough to tell
+    clipboard captures apart without copying megabytes of raw pixels
+    every poll.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{img.width}x{img.height}".encode("ascii"))
+    h.update(img.resize((32, 32)).tobytes())
+    return h.hexdigest()
 
-def _save_temp(img: Image.Image) -> Path:
-    """Save the clipboard image to the data directory."""
-    BASE_DIR.mkdir(exist_ok=True)
-    timestamp = int(time.time())
-    path = BASE_DIR / f"clip_{timestamp}.png"
-    img.save(path)
+
+def _archive(img: Image.Image) -> Path:
+    """Save a processed clipboard image to the processed directory."""
+    path = PROCESSED_DIR / f"clip_{time.time_ns()}.png"
+    img.save(path, compress_level=1)
     return path
 
 
-def main() -> None:
-    print("Watching clipboard for images. Use your OS screenshot shortcut to capture a region. Press Ctrl+C to quit.")
-    PROCESSED_DIR.mkdir(exist_ok=True)
+def _csv_writer() -> None:
+    """Drain extracted rows into the CSV, keeping the file open across rows."""
+    write_header = not OUTPUT_CSV.exists()
+    with open(OUTPUT_CSV, "a", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        if write_header:
+            w.writeheader()
+        while True:
+            row = _ROW_QUEUE.get()
+            w.writerow(row)
+            if _ROW_QUEUE.empty():
+                f.flush()
+            print(f"Added {row.get('Name','')} to {OUTPUT_CSV}")
+            _ROW_QUEUE.task_done()
+
+
+def _process_image(img: Image.Image) -> None:
+    """Run OCR on a capture and queue the result for the CSV writer."""
+    row = extract(img)
+    _ROW_QUEUE.put(row)
+    _archive(img)
+
+
+def _log_failure(future) -> None:
+    """Surface exceptions from background OCR instead of dropping them."""
+    exc = future.exception()
+    if exc is not None:
+        logger.error("Clipboard capture failed", exc_info=exc)
+
+
+def _process_clipboard(last_hash: Optional[str]) -> Optional[str]:
+    """Hand off the clipboard image if it changed, returning the new hash."""
+    img = ImageGrab.grabclipboard()
+    if isinstance(img, Image.Image):
+        current = _hash_image(img)
+        if current != last_hash:
+            _EXECUTOR.submit(_process_image, img).add_done_callback(_log_failure)
+            return current
+    return last_hash
+
+
+def _watch_polling() -> None:
+    """Poll the clipboard once a second (portable fallback)."""
     last_hash: Optional[str] = None
     while True:
-        img = ImageGrab.grabclipboard()
-        if isinstance(img, Image.Image):
-            current = _hash_image(img)
-            if current != last_hash:
-                last_hash = current
-                temp_path = _save_temp(img)
-                row = extract(str(temp_path))
-                append_csv(row, OUTPUT_CSV)
-                temp_path.rename(PROCESSED_DIR / temp_path.name)
-                print(f"Added {row.get('Name','')} to {OUTPUT_CSV}")
+        last_hash = _process_clipboard(last_hash)
         time.sleep(1)
 
 
+# WM_CLIPBOARDUPDATE is not defined in older win32con versions.
+_WM_CLIPBOARDUPDATE = 0x031D
+
+
+def _watch_events() -> None:
+    """Wake only on Windows clipboard-change notifications."""
+    import ctypes
+    import win32gui
+
+    last_hash: Optional[str] = None
+
+    def wnd_proc(hwnd, msg, wparam, lparam):
+        nonlocal last_hash
+        if msg == _WM_CLIPBOARDUPDATE:
+            last_hash = _process_clipboard(last_hash)
+        return win32gui.DefWindowProc(hwnd, msg, wparam, lparam)
+
+    wc = win32gui.WNDCLASS()
+    wc.lpszClassName = "UmaClipboardWatcher"
+    wc.lpfnWndProc = wnd_proc
+    atom = win32gui.RegisterClass(wc)
+    hwnd = win32gui.CreateWindow(atom, "uma-clipboard-ocr", 0, 0, 0, 0, 0, 0, 0, 0, None)
+    ctypes.windll.user32.AddClipboardFormatListener(hwnd)
+    # Handle anything already on the clipboard before the first event.
+    last_hash = _process_clipboard(last_hash)
+    try:
+        # PumpMessages would block inside GetMessage and never give Python a
+        # chance to raise KeyboardInterrupt; draining pending messages and
+        # sleeping keeps Ctrl+C responsive between clipboard events.
+        while True:
+            win32gui.PumpWaitingMessages()
+            time.sleep(0.25)
+    finally:
+        ctypes.windll.user32.RemoveClipboardFormatListener(hwnd)
+
+
+def main() -> None:
+    print("Watching clipboard for images. Use your OS screenshot shortcut to capture a region. Press Ctrl+C to quit.")
+    BASE_DIR.mkdir(exist_ok=True)
+    PROCESSED_DIR.mkdir(exist_ok=True)
+    threading.Thread(target=_csv_writer, daemon=True).start()
+    try:
+        try:
+            import win32gui  # noqa: F401
+        except ImportError:
+            _watch_polling()
+        else:
+            _watch_events()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Let in-flight OCR finish and the writer drain queued rows so no
+        # capture is archived without its row reaching the CSV.
+        _EXECUTOR.shutdown(wait=True)
+        _ROW_QUEUE.join()
+
+
 if __name__ == "__main__":
     main()
@@ -14,7 +14,9 @@ from __future__ import annotations
 import base64
 import csv
 import gzip
+import io
 import json
+import pickle
 import re
 import os
 import subprocess
@@ -23,7 +25,8 @@ import urllib.parse
 import webbrowser
 import http.server
 import threading
-from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from dataclasses import dataclass
 from pathlib import Path
 from typing import List, Dict, Callable
@@ -34,6 +37,11 @@ import logging
 from dotenv import load_dotenv
 from rapidfuzz import process, fuzz
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 REPO_URL_TOOLS = "https://github.com/alpha123/uma-tools"
 REPO_URL_SKILL_TOOLS = "https://github.com/alpha123/uma-skill-tools"
 
@@ -62,7 +70,7 @@ LOCAL_WEB_LOGGING = os.getenv("LOCAL_WEB_LOGGING", "").strip().lower() == "true"
 log_level = os.getenv("LOG_LEVEL", "INFO").upper()
 logging.basicConfig(level=getattr(logging, log_level, logging.INFO))
 
-@dataclass
+@dataclass(slots=True)
 class Horse:
     name: str
     speed: int
@@ -94,31 +102,55 @@ class Horse:
         }
 
 
+def read_json(path: Path):
+    """Parse a JSON file, preferring orjson's faster decoder when installed."""
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+_ENSURED_REPOS: set[Path] = set()
+
+
 def ensure_repo(url: str, path: Path) -> None:
-    """Clone the repository if it does not exist."""
+    """Clone the repository if it does not exist (checked once per process)."""
+    if path in _ENSURED_REPOS:
+        return
     if not path.exists():
         path.parent.mkdir(parents=True, exist_ok=True)
         subprocess.run(["git", "clone", "--depth", "1", url, str(path)], check=True)
+    _ENSURED_REPOS.add(path)
 
 
+@lru_cache(maxsize=1)
 def load_skill_mapping() -> Dict[str, Dict[str, str]]:
     ensure_repo(REPO_URL_TOOLS, TOOLS_DIR)
     skill_file = TOOLS_DIR / "umalator-global" / "skillnames.json"
-    with open(skill_file, encoding="utf-8") as f:
-        data = json.load(f)
+    cache_file = skill_file.with_suffix(".pkl")
+    if cache_file.exists() and cache_file.stat().st_mtime >= skill_file.stat().st_mtime:
+        try:
+            mapping = pickle.loads(cache_file.read_bytes())
+            logging.debug("Loaded %d skill mappings from cache %s", len(mapping), cache_file)
+            return mapping
+        except (pickle.UnpicklingError, EOFError):
+            logging.debug("Skill mapping cache %s is corrupt, rebuilding", cache_file)
+    data = read_json(skill_file)
     mapping: Dict[str, Dict[str, str]] = {}
+    setdefault = mapping.setdefault
     for skill_id, names in data.items():
+        # One interned copy per id, shared across all of its aliases.
+        skill_id = sys.intern(skill_id)
+        slot = "inherited" if skill_id.startswith("9") else "normal"
         for name in names:
-            key = name.lower()
-            entry = mapping.setdefault(key, {"normal": "", "inherited": ""})
-            if skill_id.startswith("9"):
-                if not entry["inherited"]:
-                    entry["inherited"] = skill_id
-            else:
-                if not entry["normal"]:
-                    entry["normal"] = skill_id
-            logging.debug("Skill mapping %s -> %s", key, entry)
+            entry = setdefault(name.lower(), {"normal": "", "inherited": ""})
+            if not entry[slot]:
+                entry[slot] = skill_id
     logging.debug("Loaded %d skill mappings", len(mapping))
+    try:
+        cache_file.write_bytes(pickle.dumps(mapping, protocol=pickle.HIGHEST_PROTOCOL))
+    except OSError:
+        logging.debug("Could not write skill mapping cache %s", cache_file)
     return mapping
 
 
@@ -129,12 +161,12 @@ def _norm(s: str) -> str:
     return re.sub(r"[^a-z0-9]", "", s.lower())
 
 
+@lru_cache(maxsize=1)
 def load_uma_lookup() -> tuple[Dict[str, str], Dict[str, Dict[str, str]]]:
     """Return mappings for runner names and epithets."""
     ensure_repo(REPO_URL_TOOLS, TOOLS_DIR)
     uma_file = TOOLS_DIR / "umalator-global" / "umas.json"
-    with open(uma_file, encoding="utf-8") as f:
-        data = json.load(f)
+    data = read_json(uma_file)
     name_map: Dict[str, str] = {}
     outfit_map: Dict[str, Dict[str, str]] = {}
     for v in data.values():
@@ -153,12 +185,17 @@ def load_uma_lookup() -> tuple[Dict[str, str], Dict[str, Dict[str, str]]]:
 UMA_NAME_MAP, UMA_OUTFIT_MAP = load_uma_lookup()
 
 
+_STAT_COLS = ("Speed", "Stamina", "Power", "Guts", "Wit")
+
+
 def parse_horse(row: Dict[str, str], skill_map: Dict[str, Dict[str, str]]) -> Horse:
     logging.debug("Parsing horse row: %s", row)
     skills: List[str] = []
-    skill_names = [n.strip().lower() for n in row.get("Skills", "").split("|") if n.strip()]
+    skill_cell = row.get("Skills", "")
+    skill_names = [n.strip() for n in skill_cell.lower().split("|") if n.strip()] if skill_cell else []
+    get_ids = skill_map.get
     for idx, key in enumerate(skill_names):
-        ids = skill_map.get(key)
+        ids = get_ids(key)
         if not ids:
             logging.debug("Skill '%s' not found in mapping", key)
             continue
@@ -189,40 +226,61 @@ def parse_horse(row: Dict[str, str], skill_map: Dict[str, Dict[str, str]]) -> Ho
     outfit_id = ""
     if name_input:
         key = _norm(name_input)
-        match = process.extractOne(key, UMA_NAME_MAP.keys(), scorer=fuzz.ratio)
-        if match:
-            canonical_name = UMA_NAME_MAP[match[0]]
+        # Names coming from uma_ocr_to_csv are usually already canonical,
+        # so try a dict hit before the fuzzy sweep.
+        if key in UMA_NAME_MAP:
+            canonical_name = UMA_NAME_MAP[key]
+        else:
+            match = process.extractOne(key, UMA_NAME_MAP.keys(), scorer=fuzz.ratio, score_cutoff=70)
+            if match:
+                canonical_name = UMA_NAME_MAP[match[0]]
     ep_map = UMA_OUTFIT_MAP.get(canonical_name, {})
     if epithet_input and ep_map:
         key = _norm(epithet_input)
-        match = process.extractOne(key, ep_map.keys(), scorer=fuzz.ratio)
-        if match:
-            outfit_id = ep_map[match[0]]
+        if key in ep_map:
+            outfit_id = ep_map[key]
+        else:
+            match = process.extractOne(key, ep_map.keys(), scorer=fuzz.ratio, score_cutoff=70)
+            if match:
+                outfit_id = ep_map[match[0]]
     logging.debug("Final skill IDs for horse '%s': %s", canonical_name, skills)
+    speed, stamina, power, guts, wit = (int(row.get(c, 0) or 0) for c in _STAT_COLS)
     return Horse(
         name=canonical_name,
         outfitId=outfit_id,
-        speed=int(row.get("Speed", 0) or 0),
-        stamina=int(row.get("Stamina", 0) or 0),
-        power=int(row.get("Power", 0) or 0),
-        guts=int(row.get("Guts", 0) or 0),
-        wisdom=int(row.get("Wit", 0) or 0),
+        speed=speed,
+        stamina=stamina,
+        power=power,
+        guts=guts,
+        wisdom=wit,
         skills=skills,
     )
 
 
+_PAYLOAD_TEMPLATE = {
+    "courseId": DEFAULT_COURSE_ID,
+    "nsamples": DEFAULT_NSAMPLES,
+    "usePosKeep": DEFAULT_USE_POS_KEEP,
+    "racedef": DEFAULT_RACEDEF,
+}
+
+
 def build_share_hash(uma1: Horse, uma2: Horse) -> str:
-    payload = {
-        "courseId": DEFAULT_COURSE_ID,
-        "nsamples": DEFAULT_NSAMPLES,
-        "usePosKeep": DEFAULT_USE_POS_KEEP,
-        "racedef": DEFAULT_RACEDEF,
-        "uma1": uma1.to_json(),
-        "uma2": uma2.to_json(),
-    }
-    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
-    zipped = gzip.compress(raw)
-    return urllib.parse.quote(base64.b64encode(zipped).decode("ascii"))
+    payload = {**_PAYLOAD_TEMPLATE, "uma1": uma1.to_json(), "uma2": uma2.to_json()}
+    if orjson is not None:
+        raw = orjson.dumps(payload)
+    else:
+        raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    # Level 1 is ~5-10x faster than the default on a sub-KB payload for a
+    # negligible size difference; mtime=0 keeps the hash deterministic.
+    buf = io.BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=1, mtime=0) as gz:
+        gz.write(raw)
+    # Encode from the buffer's memoryview to skip one more bytes copy.
+    # The base64 alphabet (including +, / and =) is legal in a URL fragment
+    # and survives decodeURIComponent unchanged, so no percent-quoting pass
+    # is needed. The standard alphabet is kept for the UmaLator JS decoder.
+    return base64.b64encode(buf.getbuffer()).decode("ascii")
 
 
 def csv_to_hash(rows: List[Dict[str, str]]) -> str:
@@ -241,6 +299,11 @@ def _prepare_static_assets() -> Path:
     return TOOLS_DIR / "umalator-global"
 
 
+# Asset routes served out of the uma-tools checkout.
+_ASSET_DIRS = frozenset({"icons", "courseimages", "fonts", "strings"})
+_ROOT_JSONS = frozenset({"skill_meta.json", "umas.json", "icons.json"})
+
+
 def start_server() -> tuple[http.server.ThreadingHTTPServer, threading.Thread, int]:
     """Serve the UmaLator UI over HTTP and return server and port."""
     serve_dir = _prepare_static_assets()
@@ -250,19 +313,25 @@ def start_server() -> tuple[http.server.ThreadingHTTPServer, threading.Thread, i
             # Strip any query parameters
             path = urllib.parse.urlparse(path).path
 
-            if path.startswith("/uma-tools/"):
-                rel = path[len("/uma-tools/") :]
-                return str(TOOLS_DIR / rel)
-
-            first = path.lstrip("/").split("/", 1)[0]
-            if first in {"icons", "courseimages", "fonts", "strings"}:
-                rel = path.lstrip("/")
-                return str(TOOLS_DIR / rel)
-
-            if path.lstrip("/") in {"skill_meta.json", "umas.json", "icons.json"}:
-                return str(TOOLS_DIR / path.lstrip("/"))
-
-            return super().translate_path(path)
+            # Split once and dispatch on the first segment.
+            first, _, rest = path.lstrip("/").partition("/")
+            match first:
+                case "uma-tools":
+                    return str(TOOLS_DIR / rest)
+                case _ if first in _ASSET_DIRS:
+                    return str(TOOLS_DIR / first / rest)
+                case _ if not rest and first in _ROOT_JSONS:
+                    return str(TOOLS_DIR / first)
+                case _:
+                    return super().translate_path(path)
+
+        def copyfile(self, source, outputfile) -> None:  # type: ignore[override]
+            # Send regular files straight from the kernel page cache via
+            # os.sendfile instead of shutil's Python-level copy loop.
+            try:
+                self.connection.sendfile(source)
+            except (AttributeError, ValueError, OSError):
+                super().copyfile(source, outputfile)
 
         def log_message(self, format: str, *args: object) -> None:  # type: ignore[override]
             if LOCAL_WEB_LOGGING:
@@ -271,10 +340,23 @@ def start_server() -> tuple[http.server.ThreadingHTTPServer, threading.Thread, i
     handler = partial(UmaToolsHandler, directory=str(serve_dir))
 
     class QuietServer(http.server.ThreadingHTTPServer):
-        """HTTP server that suppresses common connection errors."""
+        """HTTP server with pooled workers that suppresses common connection errors."""
 
         daemon_threads = True
 
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            # A bounded pool instead of one fresh thread per connection;
+            # an index page pulls in dozens of assets at once.
+            self._pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="uma-http")
+
+        def process_request(self, request, client_address):  # type: ignore[override]
+            self._pool.submit(self.process_request_thread, request, client_address)
+
+        def server_close(self):  # type: ignore[override]
+            super().server_close()
+            self._pool.shutdown(wait=False)
+
         def handle_error(self, request, client_address):  # type: ignore[override]
             exc = sys.exc_info()[1]
             if isinstance(exc, ConnectionError):
@@ -289,6 +371,7 @@ def start_server() -> tuple[http.server.ThreadingHTTPServer, threading.Thread, i
 
 def run_gui(
     runners: List[Dict[str, str]],
+    horses: List[Horse],
     httpd: http.server.ThreadingHTTPServer,
     thread: threading.Thread,
     port: int,
@@ -400,12 +483,19 @@ def run_gui(
     get_left = make_column(left)
     get_right = make_column(right)
 
+    # The runner list is fixed for the session, so a pair's hash never changes.
+    share_cache: Dict[tuple[int, int], str] = {}
+
     def open_selected() -> None:
         idx1 = get_left()
         idx2 = get_right()
         if idx1 is None or idx2 is None:
             return
-        share_hash = csv_to_hash([runners[int(idx1)], runners[int(idx2)]])
+        key = (int(idx1), int(idx2))
+        share_hash = share_cache.get(key)
+        if share_hash is None:
+            share_hash = build_share_hash(horses[key[0]], horses[key[1]])
+            share_cache[key] = share_hash
         url = f"http://127.0.0.1:{port}/index.html#{share_hash}"
         try:
             webbrowser.open_new_tab(url)
@@ -445,8 +535,12 @@ def main(argv: List[str]) -> int:
         print("Need at least two runners to compare")
         return 1
 
+    # Parse every row once; pair selections then reuse the Horse objects.
+    skill_map = load_skill_mapping()
+    horses = [parse_horse(row, skill_map) for row in runners]
+
     httpd, thread, port = start_server()
-    run_gui(runners, httpd, thread, port)
+    run_gui(runners, horses, httpd, thread, port)
     return 0
 
 
@@ -1,13 +1,13 @@
 import csv
 import logging
 import os
+import pickle
 import re
 import sys
 from itertools import zip_longest
 from pathlib import Path
 
 import cv2
-import math
 import numpy as np
 from dotenv import load_dotenv
 from rapidocr_onnxruntime import RapidOCR
@@ -15,7 +15,7 @@ from rapidfuzz import process, fuzz
 import json
 
 # Reuse the skill name data source from uma_csv_to_url
-from uma_csv_to_url import REPO_URL_TOOLS, TOOLS_DIR, ensure_repo
+from uma_csv_to_url import REPO_URL_TOOLS, TOOLS_DIR, ensure_repo, read_json
 
 
 ENV_PATH = Path(__file__).with_name(".env")
@@ -30,18 +30,42 @@ logger = logging.getLogger(__name__)
 logger.debug("Environment loaded from %s with log level %s", ENV_PATH, LOG_LEVEL)
 
 
+def _load_cached(source: Path, tag: str, build) -> list:
+    """Load ``build(read_json(source))``, memoized in a pickle beside it.
+
+    The pickle is regenerated whenever the source file's mtime is newer,
+    so updating the uma-tools checkout invalidates the cache naturally.
+    """
+    cache = source.with_suffix(f".{tag}.pkl")
+    try:
+        if cache.stat().st_mtime >= source.stat().st_mtime:
+            with open(cache, "rb") as f:
+                return pickle.load(f)
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+        pass
+    data = build(read_json(source))
+    try:
+        with open(cache, "wb") as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        logger.debug("Could not write cache %s", cache)
+    return data
+
+
 def _load_skills() -> list[str]:
     """Load canonical skill names from the uma-tools repository."""
     ensure_repo(REPO_URL_TOOLS, TOOLS_DIR)
     skill_file = TOOLS_DIR / "umalator-global" / "skillnames.json"
     logger.debug("Loading skills from %s", skill_file)
     try:
-        with open(skill_file, encoding="utf-8") as f:
-            data = json.load(f)
+        skills = _load_cached(
+            skill_file,
+            "skills",
+            lambda data: [names[0] for names in data.values() if names],
+        )
     except FileNotFoundError:
         logger.error("Skill file not found: %s", skill_file)
         return []
-    skills = [names[0] for names in data.values() if names]
     logger.info("Loaded %d skills", len(skills))
     return skills
 
@@ -54,17 +78,20 @@ def _load_umas() -> list[str]:
     ensure_repo(REPO_URL_TOOLS, TOOLS_DIR)
     uma_file = TOOLS_DIR / "umalator-global" / "umas.json"
     logger.debug("Loading umas from %s", uma_file)
+
+    def build(data: dict) -> list[str]:
+        names: list[str] = []
+        for v in data.values():
+            for name in v.get("name", []):
+                if name:
+                    names.append(name)
+        return names
+
     try:
-        with open(uma_file, encoding="utf-8") as f:
-            data = json.load(f)
+        names = _load_cached(uma_file, "names", build)
     except FileNotFoundError:
         logger.error("Uma file not found: %s", uma_file)
         return []
-    names: list[str] = []
-    for v in data.values():
-        for name in v.get("name", []):
-            if name:
-                names.append(name)
     logger.info("Loaded %d umas", len(names))
     return names
 
@@ -77,17 +104,20 @@ def _load_epithets() -> list[str]:
     ensure_repo(REPO_URL_TOOLS, TOOLS_DIR)
     uma_file = TOOLS_DIR / "umalator-global" / "umas.json"
     logger.debug("Loading epithets from %s", uma_file)
+
+    def build(data: dict) -> list[str]:
+        epithets: list[str] = []
+        for v in data.values():
+            for epithet in v.get("outfits", {}).values():
+                if epithet:
+                    epithets.append(epithet)
+        return epithets
+
     try:
-        with open(uma_file, encoding="utf-8") as f:
-            data = json.load(f)
+        epithets = _load_cached(uma_file, "epithets", build)
     except FileNotFoundError:
         logger.error("Uma file not found: %s", uma_file)
         return []
-    epithets: list[str] = []
-    for v in data.values():
-        for epithet in v.get("outfits", {}).values():
-            if epithet:
-                epithets.append(epithet)
     logger.info("Loaded %d epithets", len(epithets))
     return epithets
 
@@ -96,31 +126,51 @@ CANONICAL_EPITHETS = _load_epithets()
 
 # --- normalization ---------------------------------------------------------
 
-_CIRCLE_ALIASES = {
+_CIRCLE_TRANS = str.maketrans({
     "o": "○",
     "O": "○",
     "0": "○",
     "〇": "○",
-    "◎": "◎",
-    "○": "○",
-}
+})
+
+_NORM_RE = re.compile(r"[^a-z0-9◎○]")
 
 
 def _normalize_circles(text: str) -> str:
     """Replace common lookalikes of the circle glyphs."""
-    return "".join(_CIRCLE_ALIASES.get(ch, ch) for ch in text)
+    return text.translate(_CIRCLE_TRANS)
 
 
 def _norm(s: str) -> str:
-    s = _normalize_circles(s)
-    return re.sub(r"[^a-z0-9◎○]", "", s.lower())
+    return _NORM_RE.sub("", _normalize_circles(s).lower())
 
 
 CANONICAL_MAP = {_norm(name): name for name in CANONICAL_SKILLS}
 UMA_MAP = {_norm(name): name for name in CANONICAL_UMAS}
 EPITHET_MAP = {_norm(e): e for e in CANONICAL_EPITHETS}
 
-OCR = RapidOCR()
+# Stable choice lists for batched fuzzy matching. Keys are already
+# normalized, so every matcher call passes processor=None to stop
+# RapidFuzz re-processing the choices per query.
+CANONICAL_KEYS = tuple(CANONICAL_MAP)
+UMA_KEYS = tuple(UMA_MAP)
+EPITHET_KEYS = tuple(EPITHET_MAP)
+
+# Let ONNX Runtime use every core inside a single inference; the
+# pipeline stages already run sequentially, so inter-op stays at 1.
+_OCR_KWARGS = {"intra_op_num_threads": os.cpu_count(), "inter_op_num_threads": 1}
+if os.environ.get("UMA_OCR_GPU"):
+    # Opt-in: route inference through CUDA when the onnxruntime-gpu build
+    # is installed. ORT falls back to CPU on machines without a usable GPU.
+    _OCR_KWARGS.update(det_use_cuda=True, rec_use_cuda=True, cls_use_cuda=True)
+try:
+    OCR = RapidOCR(**_OCR_KWARGS)
+except TypeError:
+    # Older rapidocr releases do not take the ORT tuning kwargs.
+    OCR = RapidOCR()
+# Run a tiny blank image through the pipeline once so ONNX Runtime builds
+# its optimized graphs before the first real screenshot arrives.
+OCR(np.zeros((32, 32, 3), dtype=np.uint8))
 
 
 def _group_column(lines):
@@ -136,16 +186,24 @@ def _group_column(lines):
     return grouped
 
 
-def _group_skills(res):
+def _box_bounds(res):
+    """Return (x0, y0, x1, y1) arrays covering every OCR box in one pass."""
+    if not res:
+        empty = np.empty(0, dtype=np.float32)
+        return empty, empty, empty, empty
+    boxes = np.asarray([r[0] for r in res], dtype=np.float32)
+    xs = boxes[:, :, 0]
+    ys = boxes[:, :, 1]
+    return xs.min(axis=1), ys.min(axis=1), xs.max(axis=1), ys.max(axis=1)
+
+
+def _group_skills(res, bounds, y_min):
+    x0s, y0s, x1s, y1s = bounds
     lines = []
-    for box, text, _ in res:
-        x0 = min(p[0] for p in box)
-        y0 = min(p[1] for p in box)
-        x1 = max(p[0] for p in box)
-        y1 = max(p[1] for p in box)
-        if y0 < 850:
+    for i, (_box, text, _score) in enumerate(res):
+        if y0s[i] < y_min:
             continue
-        lines.append([x0, y0, x1, y1, text])
+        lines.append([x0s[i], y0s[i], x1s[i], y1s[i], text])
 
     if not lines:
         return []
@@ -165,6 +223,13 @@ def _group_skills(res):
 
 
 def _detect_circle(img, rect):
+    """Classify the circle glyph at the right edge of a skill box.
+
+    ○ draws all of its ink near the outer radius while ◎ adds a second
+    ring closer to the center, so comparing how much ink sits inside
+    three quarters of the glyph radius separates the two without the
+    Hough accumulator.
+    """
     x0, y0, x1, y1 = map(int, rect)
     margin = 5
     xs = max(0, x1 - 50)
@@ -175,131 +240,178 @@ def _detect_circle(img, rect):
     if crop.size == 0:
         return None
     gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
-    gray = cv2.GaussianBlur(gray, (5, 5), 0)
-    circles = cv2.HoughCircles(
-        gray, cv2.HOUGH_GRADIENT, 1, 20, param1=50, param2=15, minRadius=5, maxRadius=30
-    )
-    if circles is None:
+    ink_y, ink_x = np.nonzero(gray < 128)
+    if ink_y.size < 20:
+        return None
+    h = ink_y.max() - ink_y.min()
+    w = ink_x.max() - ink_x.min()
+    if h < 8 or w < 8 or not 0.6 < h / w < 1.6:
+        # Not roughly square: leftover letter strokes, not a circle.
         return None
-    cx, cy, r = max(circles[0], key=lambda c: c[2])
-    canny = cv2.Canny(gray, 50, 150)
-    mask = np.zeros_like(canny)
-    inner_r = int(r * 0.55)
-    cv2.circle(mask, (int(cx), int(cy)), inner_r, 255, 2)
-    count = cv2.countNonZero(cv2.bitwise_and(canny, mask))
-    coverage = count / (2 * math.pi * inner_r)
-    if coverage > 0.6:
+    cy = ink_y.mean()
+    cx = ink_x.mean()
+    r = max(h, w) / 2
+    inner = (np.hypot(ink_y - cy, ink_x - cx) < r * 0.75).mean()
+    if inner > 0.3:
         return "◎"
     return "○"
 
 
-def extract(path: str) -> dict:
-    logger.info("Running OCR on %s", path)
-    res, _ = OCR(path)
+def _run_ocr(image) -> tuple:
+    """Load a file path, BGR ndarray or PIL image and run OCR on it.
+
+    In-memory images skip the PNG encode/decode round trip entirely.
+    Kept separate from the result parsing so callers can overlap the
+    ONNXRuntime-bound part (which releases the GIL) if they want to.
+    """
+    if isinstance(image, (str, Path)):
+        source = str(image)
+        img = cv2.imread(source)
+    elif isinstance(image, np.ndarray):
+        source = "<ndarray>"
+        img = image
+    else:
+        source = "<clipboard>"
+        img = cv2.cvtColor(np.asarray(image.convert("RGB")), cv2.COLOR_RGB2BGR)
+    logger.info("Running OCR on %s", source)
+    res, _ = OCR(img)
     logger.debug("OCR returned %d text boxes", len(res))
-    img = cv2.imread(path)
+    return img, res, source
+
+
+def extract(image) -> dict:
+    """Extract runner data from a file path, BGR ndarray or PIL image."""
+    img, res, source = _run_ocr(image)
 
     height, width = img.shape[:2]
+    texts = [r[1] for r in res]
+    x0s, y0s, x1s, y1s = _box_bounds(res)
+
+    # Absolute pixel cutoffs tuned on the reference captures in data/test
+    # (~1700-2080px tall); the name block sits above y=400 and the skill
+    # grid starts below y=850 on that geometry.
+    y_name_max = 400
+    y_skill_min = 850
 
     # --- runner name --------------------------------------------------------
     runner_name = ""
     name_box = None
-    best_score = 0
-    for box, text, _ in res:
-        x0 = min(p[0] for p in box)
-        y0 = min(p[1] for p in box)
-        x1 = max(p[0] for p in box)
-        y1 = max(p[1] for p in box)
-        if y1 < 400 and x0 > width * 0.5:
+    name_keys = []
+    name_boxes = []
+    for i, text in enumerate(texts):
+        if y1s[i] < y_name_max and x0s[i] > width * 0.5:
             key = _norm(text)
             if not key:
                 continue
-            match = process.extractOne(key, UMA_MAP.keys(), scorer=fuzz.ratio)
-            if match and match[1] > best_score:
-                best_score = match[1]
-                runner_name = UMA_MAP[match[0]]
-                name_box = (x0, y0, x1, y1)
+            name_keys.append(key)
+            name_boxes.append((x0s[i], y0s[i], x1s[i], y1s[i]))
+    if name_keys and UMA_KEYS:
+        # One score matrix over all candidate lines instead of a Python
+        # round-trip per line. Skipped when umas.json was missing: argmax
+        # over the resulting (n, 0) matrix would raise.
+        scores = process.cdist(
+            name_keys, UMA_KEYS, scorer=fuzz.ratio, processor=None, workers=-1
+        )
+        qi, ci = divmod(int(scores.argmax()), scores.shape[1])
+        if scores[qi, ci] > 0:
+            runner_name = UMA_MAP[UMA_KEYS[ci]]
+            name_box = name_boxes[qi]
     if not runner_name:
-        logger.warning("Runner name not detected in %s", path)
+        logger.warning("Runner name not detected in %s", source)
 
     # --- epithet -------------------------------------------------------------
     epithet = ""
     if name_box is not None:
         name_top = name_box[1]
-        candidates: list[tuple[int, str]] = []
-        for box, text, _ in res:
-            x0 = min(p[0] for p in box)
-            y0 = min(p[1] for p in box)
-            y1 = max(p[1] for p in box)
-            if y1 <= name_top and x0 > width * 0.5:
-                candidates.append((y0, text))
+        candidates: list[tuple[float, str]] = []
+        for i, text in enumerate(texts):
+            if y1s[i] <= name_top and x0s[i] > width * 0.5:
+                candidates.append((y0s[i], text))
         candidates.sort()
         epithet_text = " ".join(t for _, t in candidates).strip()
         key = _norm(epithet_text)
         if key:
-            match = process.extractOne(key, EPITHET_MAP.keys(), scorer=fuzz.ratio)
+            match = process.extractOne(key, EPITHET_KEYS, scorer=fuzz.ratio, processor=None)
             if match:
                 epithet = EPITHET_MAP[match[0]]
     if not epithet:
-        logger.warning("Epithet not detected in %s", path)
+        logger.warning("Epithet not detected in %s", source)
 
     # --- stats ---------------------------------------------------------------
-    nums = []
-    for box, text, _ in res:
-        if re.fullmatch(r"\d{3,4}", text):
-            x0 = min(p[0] for p in box)
-            y0 = min(p[1] for p in box)
-            nums.append((y0, x0, text))
-
-    nums.sort()
+    num_idx = [
+        i for i, text in enumerate(texts) if 3 <= len(text) <= 4 and text.isdigit()
+    ]
     stats_vals = ["", "", "", "", ""]
-    if nums:
-        first_y = nums[0][0]
-        row = [n for n in nums if abs(n[0] - first_y) < 30]
-        row.sort(key=lambda n: n[1])
-        stats_vals = [n[2] for n in row[:5]]
+    if num_idx:
+        ys = y0s[num_idx]
+        xs = x0s[num_idx]
+        # Top row of numbers, left to right, without sorting the whole set.
+        row = np.nonzero(np.abs(ys - ys.min()) < 30)[0]
+        order = row[xs[row].argsort()][:5]
+        stats_vals = [texts[num_idx[i]] for i in order]
         logger.debug("Detected stat numbers: %s", stats_vals)
     else:
-        logger.warning("No stat numbers detected in %s", path)
+        logger.warning("No stat numbers detected in %s", source)
 
     stats = dict(zip(["Speed", "Stamina", "Power", "Guts", "Wit"], stats_vals))
 
     # --- skills --------------------------------------------------------------
-    skills = []
-    seen = set()
-
-    groups = _group_skills(res)
+    groups = _group_skills(res, (x0s, y0s, x1s, y1s), y_skill_min)
     logger.debug("Grouped into %d skill boxes", len(groups))
+    # One slot per distinct key, in screenshot order. Clean reads resolve
+    # through CANONICAL_MAP immediately; misreads hold a None placeholder
+    # that the fuzzy batch fills in, so the top-of-list unique skill keeps
+    # position 0 even when it is the only misread.
+    matches: dict[str, str | None] = {}
     for x0, y0, x1, y1, text in groups:
         circle = _detect_circle(img, (x0, y0, x1, y1))
         if circle and circle not in text:
             text = f"{text} {circle}"
         key = _norm(text)
-        if not key:
-            continue
-        match = process.extractOne(key, CANONICAL_MAP.keys(), scorer=fuzz.ratio, score_cutoff=80)
-        if match:
-            canonical = CANONICAL_MAP[match[0]]
-            if canonical not in seen:
-                seen.add(canonical)
-                skills.append(canonical)
-                logger.debug("Matched skill: %s", canonical)
+        if key and key not in matches:
+            matches[key] = CANONICAL_MAP.get(key)
+    fuzzy_keys = [k for k, v in matches.items() if v is None]
+    # CANONICAL_KEYS is empty when skillnames.json was missing; argmax over
+    # the resulting (n, 0) matrix would raise.
+    if fuzzy_keys and CANONICAL_KEYS:
+        scores = process.cdist(
+            fuzzy_keys,
+            CANONICAL_KEYS,
+            scorer=fuzz.ratio,
+            processor=None,
+            score_cutoff=80,
+            workers=-1,
+        )
+        best = scores.argmax(axis=1)
+        valid = scores[np.arange(len(best)), best] >= 80
+        for qi in np.nonzero(valid)[0]:
+            matches[fuzzy_keys[qi]] = CANONICAL_MAP[CANONICAL_KEYS[best[qi]]]
+
+    skills = []
+    seen = set()
+    for canonical in matches.values():
+        if canonical is not None and canonical not in seen:
+            seen.add(canonical)
+            skills.append(canonical)
+            logger.debug("Matched skill: %s", canonical)
 
     stats["Skills"] = "|".join(skills)
     stats["Name"] = runner_name
     stats["Epithet"] = epithet
     logger.info("Extracted stats %s with %d skills", stats, len(skills))
     if not skills:
-        logger.warning("No skills matched in %s", path)
+        logger.warning("No skills matched in %s", source)
     return stats
 
 
+CSV_FIELDS = ["Name", "Epithet", "Speed", "Stamina", "Power", "Guts", "Wit", "Skills"]
+
+
 def append_csv(row: dict, output: Path) -> None:
     """Append a single row of stats to the CSV file, writing a header if needed."""
-    fields = ["Name", "Epithet", "Speed", "Stamina", "Power", "Guts", "Wit", "Skills"]
     write_header = not output.exists()
     with open(output, "a", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=fields)
+        w = csv.DictWriter(f, fieldnames=CSV_FIELDS)
         if write_header:
             w.writeheader()
         w.writerow(row)
@@ -317,9 +429,19 @@ if __name__ == "__main__":
         logger.info("No images found in %s", base_dir)
         sys.exit(0)
 
-    for img_path in images:
-        logger.info("Extracting data from %s", img_path)
-        row = extract(str(img_path))
+    if len(images) > 1:
+        # OCR is embarrassingly parallel across images; each worker process
+        # builds its own RapidOCR instance on import.
+        from concurrent.futures import ProcessPoolExecutor
+
+        workers = min(len(images), max(1, (os.cpu_count() or 2) // 2))
+        logger.info("Extracting %d images with %d workers", len(images), workers)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            rows = executor.map(extract, [str(p) for p in images])
+    else:
+        rows = (extract(str(p)) for p in images)
+
+    for img_path, row in zip(images, rows):
         append_csv(row, output_path)
         img_path.rename(processed_dir / img_path.name)
         logger.info("Moved %s to %s", img_path.name, processed_dir)